@@ -1,4 +1,5 @@
 from __future__ import annotations
+import re
 from discord_hvz.utilities import make_tag_code
 from datetime import datetime, timedelta
 from dateutil import parser
@@ -43,6 +44,8 @@ Example: raise ValueError('You have entered a bad value. Please try again.')
 
 """
 
+YESTERDAY_PATTERN = re.compile('yesterday', re.IGNORECASE)
+
 def name(input_text: str, bot: HVZBot):
     return input_text
 
@@ -66,13 +69,21 @@ def tag_code_to_member_id(input_text: str, bot: HVZBot) -> str:
 
 def tag_time(input_text: str, bot: HVZBot) -> datetime:
     given_tag_time: str = input_text
-    tag_datetime = datetime.now(tz=config.time_zone)
-    if given_tag_time.casefold().find('yesterday') != -1:
-        tag_datetime -= timedelta(days=1)
-        given_tag_time = given_tag_time.replace('yesterday', '').replace('Yesterday', '')
-    tag_datetime = parser.parse(given_tag_time + ' and 0 seconds', default=tag_datetime)
+    now = datetime.now(tz=config.time_zone)
+    tag_day = now.replace(second=0, microsecond=0)
+    if YESTERDAY_PATTERN.search(given_tag_time):
+        tag_day -= timedelta(days=1)
+        given_tag_time = YESTERDAY_PATTERN.sub('', given_tag_time)
+
+    # Times are almost always like "3:45 PM", which strptime handles far faster than dateutil's general parser
+    try:
+        parsed_time = datetime.strptime(given_tag_time.replace(' ', ''), '%I:%M%p')
+    except ValueError:
+        tag_datetime = parser.parse(given_tag_time, default=tag_day)
+    else:
+        tag_datetime = tag_day.replace(hour=parsed_time.hour, minute=parsed_time.minute)
 
-    if tag_datetime > datetime.now(tz=config.time_zone):
+    if tag_datetime > now:
         raise ValueError('The tag time you stated is in the future. Try again.')
 
     return tag_datetime
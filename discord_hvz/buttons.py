@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import random
 import typing
-from typing import List, Optional
+from typing import Dict, Optional
 
 import discord
 from discord.commands import Option
@@ -129,13 +129,12 @@ async def post_button(
         if selection in added_functions:
             error_msg += f'The button "{selection}" is already added. Cannot use the same button twice in one post.'
             continue
-        for button in button_cog.postable_buttons:
-            if button.custom_id == selection:
-                view.add_item(button)
-                added_functions.append(selection)
-                break
-        else:
+        button = button_cog.postable_buttons.get(selection)
+        if button is None:
             error_msg += f'Could not find the postable button "{selection}". Probably a bug.\n'
+            continue
+        view.add_item(button)
+        added_functions.append(selection)
     if added_functions:
         await ctx.channel.send(text, view=view)
     if error_msg:
@@ -149,12 +148,12 @@ class HVZButtonCog(commands.Cog):
     and to initialize the view again when the bot is restarted
     """
     bot: HVZBot
-    postable_buttons: List[HVZButton]
+    postable_buttons: Dict[str, HVZButton]  # Maps custom_ids to buttons
     readied: bool  # If the on_ready event has fired for this object
 
     def __init__(self, bot: "HVZBot"):
         self.bot = bot
-        self.postable_buttons = []
+        self.postable_buttons = {}
         self.readied = False
 
     @commands.Cog.listener()
@@ -164,8 +163,8 @@ class HVZButtonCog(commands.Cog):
         self.readied = True
         button_options = []
         view = discord.ui.View(timeout=None)  # A view to hold persistent buttons
-        for button in self.postable_buttons:
-            button_options.append(button.custom_id)
+        for custom_id, button in self.postable_buttons.items():
+            button_options.append(custom_id)
             view.add_item(button)
         self.bot.add_view(view)  # Any buttons in this view are now persistent
 
@@ -194,7 +193,7 @@ class HVZButtonCog(commands.Cog):
             logger.error('Cannot add a postable button after on_ready has been called.')
             return
 
-        self.postable_buttons.append(button)
+        self.postable_buttons[button.custom_id] = button
 
 
 def setup(bot):  # this is called by Pycord to setup the cog
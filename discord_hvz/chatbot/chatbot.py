@@ -1,13 +1,12 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from typing import TYPE_CHECKING
 
 import discord
-import regex
 from discord.ext import commands
 from loguru import logger
 from ruamel.yaml import YAML
@@ -15,21 +14,21 @@ from ruamel.yaml import YAML
 if TYPE_CHECKING:
     from discord_hvz.main import HVZBot
 
-from discord_hvz.config import config, ConfigError, ConfigChecker
+from discord_hvz.config import config, ConfigError, ConfigChecker, load_yaml_cached
 from discord_hvz.buttons import HVZButton
 
 import chatbotprocessors
 from .modal import ChatbotModal
-from .chatbot_utilities import Response, ResponseError, ChatbotState, disable_previous_buttons
+from .chatbot_utilities import Response, ResponseError, ChatbotState, disable_previous_buttons, DATACLASS_SLOTS
 
 log = logger
-yaml = YAML(typ='safe')
+yaml = YAML(typ='safe', pure=False)  # pure=False selects the libyaml C parser when ruamel.yaml.clib is installed
 
 # Used for creating commands
 guild_id_list = [config['server_id']]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class QuestionData:
     '''
     A static data structure to store a question that is part of a chatbot.
@@ -44,11 +43,27 @@ class QuestionData:
     processor: callable = None
     modal_default: str = None
     modal_long: bool = False
+    _compiled_regex: re.Pattern = field(init=False, default=None, repr=False, compare=False)
 
     coupled_attributes = [
         ('valid_regex', 'rejection_response'),
     ]  # Attributes where if one appears, the other must also
 
+    def __post_init__(self):
+        # Compile the validation pattern once so that each response doesn't have to
+        if self.valid_regex:
+            try:
+                compiled = re.compile(self.valid_regex)
+            except re.error:
+                # Fall back to the regex module for syntax the standard library doesn't support, such as \p{L}
+                import regex
+                try:
+                    compiled = regex.compile(self.valid_regex)
+                except regex.error as e:
+                    raise ConfigError(
+                        f'Question {self.column} has an invalid valid_regex "{self.valid_regex}": {e}. Check scripts.yml') from e
+            object.__setattr__(self, '_compiled_regex', compiled)
+
     @classmethod
     def build(cls, question_data: Dict, chatbotmanager: ChatBotManager, modal=False) -> QuestionData:
         '''
@@ -134,11 +149,13 @@ class QuestionData:
         )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, **DATACLASS_SLOTS)
 class ScriptData:
     """
     A static data structure that stores a script as part of a ChatBot.
     The names of the dataclass parameters directly map to names in the yaml file.
+    One ScriptData is shared by every ChatBot of its kind, so it must never be modified after it is built.
+    Anything that changes during a conversation belongs on the ChatBot.
     """
     kind: str
     table: str
@@ -153,6 +170,20 @@ class ScriptData:
     ending_processor: callable = None
     _postable_button: HVZButton = None
     config_checker: ConfigChecker = None
+    _question_indexes: Dict[str, int] = field(init=False, default=None, repr=False, compare=False)
+    _patterns: Tuple[re.Pattern | None, ...] = field(init=False, default=(), repr=False, compare=False)
+
+    def __post_init__(self):
+        # Map casefolded column and display names to question indexes once, so selecting an answer to modify
+        # is a single lookup. Columns win if a display name collides with one.
+        question_indexes = {}
+        for i, q in enumerate(self.questions):
+            question_indexes.setdefault(q.display_name.casefold(), i)
+        for i, q in enumerate(self.questions):
+            question_indexes[q.column.casefold()] = i
+        object.__setattr__(self, '_question_indexes', question_indexes)
+        # Compiled validation patterns by question index. None where a question has no valid_regex
+        object.__setattr__(self, '_patterns', tuple(q._compiled_regex for q in self.questions))
 
     def __str__(self) -> str:
         return f'[Type: {self.kind}, Table: {self.table} ]'
@@ -254,13 +285,15 @@ class ScriptData:
     def __len__(self) -> int:
         return len(self.questions)
 
+    def get_question_index(self, name: str) -> int | None:
+        '''Returns the index of the question whose column or display name matches, ignoring case. None if no match.'''
+        return self._question_indexes.get(name.casefold())
+
     def get_review_string(self, responses: dict[int, Response]) -> str:
         # Return a string list of questions and responses, useful for reviewing answers
-        output = ''
-        for i, q in enumerate(self.questions):
-            response = responses[i].raw_response
-            output += f"**{q.display_name}**: {response}\n"
-        return output
+        return ''.join(
+            f"**{q.display_name}**: {responses[i].raw_response}\n" for i, q in enumerate(self.questions)
+        )
 
     def create_modal(self, chatbot: ChatBot, interaction: discord.Interaction, disable_buttons=False) -> ChatbotModal:
         '''Creates a modal based on the script'''
@@ -286,7 +319,7 @@ class ScriptData:
         return modal
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ChatBot:
     script: ScriptData
     bot: HVZBot
@@ -312,23 +345,24 @@ class ChatBot:
         self.chatbot_manager.remove_chatbot(self)
 
     async def ask_question(self, existing_chatbot: ChatBot = None, interaction: discord.Interaction = None):
-        logger.debug(f'Asking question: next_question is {self.next_question}. State: {self.state.name}')
+        logger.debug('Asking question: next_question is {}. State: {}', self.next_question, self.state.name)
+        script = self.script
         msg = ''
         view = None
         if self.state is ChatbotState.BEGINNING:
-            if self.script.starting_processor:
+            if script.starting_processor:
                 # Should return None to continue, and raise an Error if there's a problem.
-                await self.script.starting_processor(self.target_member, self.bot)
+                await script.starting_processor(self.target_member, self.bot)
             if existing_chatbot is not None:
                 msg += f'Cancelled the previous {existing_chatbot.script.kind} conversation.\n'
             if self.target_member != self.chat_member:
                 msg += f'The following is for <@{self.target_member.id}>.\n'
-            msg += f'{self.script.beginning} \n\n'
+            msg += f'{script.beginning} \n\n'
             self.state = ChatbotState.QUESTIONING
 
         if self.state in (ChatbotState.QUESTIONING, ChatbotState.MODIFYING):
-            logger.debug(f'QUESTIONING or MODIFYING')
-            question = self.script.questions[self.next_question]
+            logger.debug('QUESTIONING or MODIFYING')
+            question = script.questions[self.next_question]
             msg += question.query
 
             if question.button_options:
@@ -340,17 +374,17 @@ class ChatBot:
             log.debug('Entered reviewing mode')
             view = discord.ui.View(timeout=None)
 
-            view.add_item(self.script.special_buttons['submit'])
-            view.add_item(self.script.special_buttons['modify'])
-            msg = self.script.get_review_string(self.responses)
+            view.add_item(script.special_buttons['submit'])
+            view.add_item(script.special_buttons['modify'])
+            msg = script.get_review_string(self.responses)
 
         elif self.state is ChatbotState.MODIFYING_SELECTION:
             view = discord.ui.View(timeout=None)
-            for button in self.script.review_selection_buttons:
+            for button in script.review_selection_buttons:
                 view.add_item(button)
             msg = 'Select answer to modify:'
 
-        if self.script.modal:
+        if script.modal:
             await self.send_modal(interaction)
         else:
             await self.chat_member.send(msg, view=view)
@@ -377,11 +411,14 @@ class ChatBot:
             return True
 
         elif self.state in (ChatbotState.QUESTIONING, ChatbotState.MODIFYING):
-            logger.debug(f'receive method got "{message}" as a message, and is processing the question.')
-            question = self.script.questions[self.next_question]
-            if question.valid_regex:
+            logger.debug('receive method got "{}" as a message, and is processing the question.', message)
+            questions = self.script.questions
+            question_index = self.next_question
+            question = questions[question_index]
+            pattern = self.script._patterns[question_index]
+            if pattern is not None:
                 logger.debug('Processing regex...')
-                match = regex.fullmatch(r'{}'.format(question.valid_regex), message)
+                match = pattern.fullmatch(message)
                 if match is None:
                     msg = f'{question.rejection_response} Please try again.'
                     await self.chat_member.send(msg)
@@ -395,10 +432,10 @@ class ChatBot:
                     await self.chat_member.send(str(e))
                     return False
 
-            self.responses[self.next_question] = Response(message, processed_response)
-            self.next_question += 1
+            self.responses[question_index] = Response(message, processed_response)
+            self.next_question = question_index + 1
 
-            if (self.next_question > len(self.script) - 1) or (self.state is ChatbotState.MODIFYING):
+            if (self.next_question >= len(questions)) or (self.state is ChatbotState.MODIFYING):
                 self.state = ChatbotState.REVIEWING
 
 
@@ -425,16 +462,13 @@ class ChatBot:
                 return False
 
         elif self.state is ChatbotState.MODIFYING_SELECTION:
-            selection = message.casefold()
-            for i, q in enumerate(self.script.questions):
-                if selection == (q.column.casefold() or q.display_name.casefold()):
-                    self.next_question = i
-                    self.state = ChatbotState.MODIFYING
-                    break
-            else:
+            selected_index = self.script.get_question_index(message)
+            if selected_index is None:
                 await self.chat_member.send(
                     'That is an invalid response. Please use the buttons to select, or type "cancel"')
                 return False
+            self.next_question = selected_index
+            self.state = ChatbotState.MODIFYING
 
         await self.ask_question()
         return False
@@ -470,16 +504,16 @@ class ChatBotManager(commands.Cog, guild_ids=guild_id_list):
     The cog that the main bot imports to run the chatbot system.
     '''
     bot: HVZBot
-    active_chatbots: Dict[int, ChatBot] = {}  # Maps member ids to ChatBots
-    loaded_scripts: Dict[str, ScriptData] = {}
+    active_chatbots: Dict[int, ChatBot]  # Maps member ids to ChatBots
+    loaded_scripts: Dict[str, ScriptData]
 
     def __init__(self, bot: HVZBot, chatbot_config_checkers: Dict = None):
         self.bot = bot
+        self.active_chatbots = {}
+        self.loaded_scripts = {}
         startup_data = bot.get_cog_startup_data(self)
         path = config.path_root / "scripts.yml"
-        file = open(path, mode='r')
-        scripts_data = yaml.load(file)
-        file.close()
+        scripts_data = load_yaml_cached(path, yaml)
 
         for kind, script in scripts_data.items():
 
@@ -568,7 +602,8 @@ class ChatBotManager(commands.Cog, guild_ids=guild_id_list):
         A listener function that will receive direct messages from users.
         The happy path will call receive_response()
         '''
-        if message.channel.type != discord.ChannelType.private or message.author.bot:
+        # Nearly all messages are in the server, so reject them with the cheapest checks first
+        if message.author.bot or message.channel.type is not discord.ChannelType.private:
             return
         author_id = message.author.id
         response_text = str(message.clean_content)
@@ -580,7 +615,7 @@ class ChatBotManager(commands.Cog, guild_ids=guild_id_list):
         This is the sole method that non-modal chatbots respond to buttons.
         The happy path will call receive_response()
         """
-        if interaction.type != discord.InteractionType.component:
+        if interaction.type is not discord.InteractionType.component:
             log.warning('receive_interaction got something other than a component')
             return
         if interaction.channel.type in (discord.ChannelType.private, discord.ChannelType.text):
@@ -601,7 +636,7 @@ class ChatBotManager(commands.Cog, guild_ids=guild_id_list):
         '''
         Receives all responses to a chatbot: direct messages, buttons, modals, etc.
         '''
-        log.debug(f'author_id: {author_id} response_text: {response_text}')
+        log.debug('author_id: {} response_text: {}', author_id, response_text)
         chatbot = self.active_chatbots.get(author_id)
 
         if chatbot is None or chatbot.processing is True:
@@ -631,16 +666,13 @@ class ChatBotManager(commands.Cog, guild_ids=guild_id_list):
         return text[:text.find(':')]
 
     def list_active_chatbots(self) -> List[str]:
-        output_list = []
-        for i, chatbot in self.active_chatbots.items():
-            output_list.append(str(chatbot))
-        return output_list
+        return [str(chatbot) for chatbot in self.active_chatbots.values()]
 
 
 
     async def shutdown(self):
         '''Sends a shutdown message to all members in a chatbot'''
-        for i, chatbot in self.active_chatbots.items():
+        for chatbot in self.active_chatbots.values():
             await chatbot.chat_member.send(
                 'Unfortunately, the bot has shut down. You will need to restart this chatbot when it comes back online.'
             )
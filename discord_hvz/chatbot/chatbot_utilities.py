@@ -1,9 +1,14 @@
+import sys
 from dataclasses import dataclass
 from typing import Any
 from enum import Enum
 import discord
 from discord_hvz.buttons import HVZButton
 
+# Keyword arguments for dataclasses that are created often. slots=True drops the per-instance __dict__,
+# but dataclass() only accepts it on Python 3.10 and later.
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
 
 class ResponseError(ValueError):
     '''
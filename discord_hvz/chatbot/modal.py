@@ -3,7 +3,6 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import discord
-import regex
 
 from .chatbot_utilities import Response, ResponseError, ChatbotState, disable_previous_buttons
 
@@ -46,10 +45,11 @@ class ChatbotModal(discord.ui.Modal):
 
         self.chatbot.state = ChatbotState.REVIEWING
 
+        patterns = self.chatbot.script._patterns
         for i, question in enumerate(self.chatbot.script.questions):
             self.chatbot.responses[i] = Response(raw_responses[i], raw_responses[i])
-            if question.valid_regex:
-                match = regex.fullmatch(r'{}'.format(question.valid_regex), raw_responses[i])
+            if patterns[i] is not None:
+                match = patterns[i].fullmatch(raw_responses[i])
                 if match is None:
                     errors.append(question.rejection_response)
                     any_error = True
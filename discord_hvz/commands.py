@@ -1,5 +1,5 @@
 # from __future__ import annotations
-import time
+import asyncio
 from typing import Union, TYPE_CHECKING, Optional
 
 import discord
@@ -15,12 +15,6 @@ if TYPE_CHECKING:
     from main import HVZBot
     from chatbot import ChatBotManager
 
-def dump(obj):
-    """Prints the passed object in a very detailed form for debugging"""
-    for attr in dir(obj):
-        print("obj.%s = %r" % (attr, getattr(obj, attr)))
-
-
 DISCORD_MESSAGE_MAX_LENGTH = 2000
 
 guild_id_list = [config['server_id']]
@@ -422,7 +416,7 @@ class AdminCommandsCog(commands.Cog, guild_ids=guild_id_list):
         await ctx.respond('Shutting Down')
         logger.critical('Shutting Down\n. . .\n\n')
         await bot.close()
-        time.sleep(1)
+        await asyncio.sleep(1)
 
     @slash_command(name='oz')
     async def oz(
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import pickle
 import sys
-from typing import Dict, List
+from typing import Any, Dict, List
 from ruamel.yaml import YAML
 from datetime import datetime, timedelta, timezone
 from dateutil import tz
@@ -19,6 +20,7 @@ yaml.preserve_quotes = True
 # config = yaml.safe_load(file)
 
 DEFAULT_DB_PATH = Path('game_database.db')
+YAML_CACHE_FOLDER = '.cache'  # Created beside the yaml file being cached
 
 class ConfigError(Exception):
     def __init__(self, message=None):
@@ -26,6 +28,41 @@ class ConfigError(Exception):
             super().__init__(message)
 
 
+def load_yaml_cached(path: Path, loader: YAML) -> Any:
+    """
+    Loads a yaml file, reusing a pickled copy of the parsed data if the file hasn't changed since it was cached.
+    The cache is keyed on the file's modification time and size, so any edit to the file causes a fresh parse.
+    Only use this with a safe loader: the cached data must be plain Python objects.
+    :param path: Path of the yaml file
+    :param loader: The YAML object to parse with on a cache miss
+    :return: The parsed contents of the file
+    """
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    cache_path = path.parent / YAML_CACHE_FOLDER / f'{path.name}.pickle'
+
+    try:
+        with open(cache_path, mode='rb') as fp:
+            cached = pickle.load(fp)
+        if cached['key'] == key:
+            return cached['data']
+    except Exception:
+        # A missing, outdated, or corrupt cache just means parsing the file again
+        pass
+
+    with open(path, mode='r') as fp:
+        data = loader.load(fp)
+
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        with open(cache_path, mode='wb') as fp:
+            pickle.dump({'key': key, 'data': data}, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.debug(f'Could not write the yaml cache for {path.name}: {e}')
+
+    return data
+
+
 class HVZConfig:
     _config: dict
     path_root: Path
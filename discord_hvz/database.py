@@ -1,35 +1,48 @@
 from __future__ import annotations
 
 import copy
+import functools
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import List, Union, Dict, TYPE_CHECKING, ClassVar
+from typing import List, Union, Dict, TYPE_CHECKING, ClassVar, Any, Callable, Tuple
 
 import discord
 import sqlalchemy
 from loguru import logger
-from sqlalchemy import Table, Column, Integer, String, DateTime, Boolean
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy import select, delete, update
+from sqlalchemy import Table, Column, Index, Integer, String, DateTime, Boolean
+from sqlalchemy import create_engine, MetaData, event
+from sqlalchemy import select, delete, update, bindparam
 from sqlalchemy.engine import Row
+from sqlalchemy.sql import Executable
 from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.pool import StaticPool
 
 from discord_hvz.sheets import SheetsInterface
 from discord_hvz.config import config
 
 # TODO: Make database name more human-friendly by default, and have it configurable
 
+# Run on every new SQLite connection. WAL with synchronous=NORMAL only syncs at checkpoints rather than on every
+# commit, which suits the bot's many small writes. A crash can lose the last commits, but not corrupt the database.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-8000',  # Negative means KiB, so about 8 MB of page cache
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
 if TYPE_CHECKING:
     pass
 
-def dump(obj):
-    """Prints the passed object in a very detailed form for debugging"""
-    for attr in dir(obj):
-        try:
-            print("obj.%s = %r" % (attr, getattr(obj, attr)))
-        except Exception:
-            print('TYPE ERROR')
-
 @dataclass
 class HvzDb:
     engine: sqlalchemy.engine.Engine = field(init=False)
@@ -38,6 +51,13 @@ class HvzDb:
     sheet_interface: SheetsInterface = field(init=False, default=None)
     filepath: Path = config.db_path
     database_config: Dict[str, Dict[str, str]] = field(init=False, default_factory=dict)
+    # Statements built with bind parameters, reused across calls. Keyed by the Table object and the query's shape
+    _statements: Dict[Tuple, Executable] = field(init=False, default_factory=dict, repr=False)
+    # Results of _validate_column_selection, keyed by (Table, column names)
+    _column_selections: Dict[Tuple, Column | Tuple[Column, ...]] = field(init=False, default_factory=dict, repr=False)
+    _column_names: Dict[Table, Tuple[str, ...]] = field(init=False, default_factory=dict, repr=False)
+    # Tables defined since the last _create_pending_tables call that may not exist in the database yet
+    _pending_creates: List[Table] = field(init=False, default_factory=list, repr=False)
 
     # Table names that cannot be created in the config. Reserved for cogs / modules
     reserved_table_names: ClassVar[List[str]] = ['persistent_panels']
@@ -57,6 +77,12 @@ class HvzDb:
         }
     }
 
+    # Columns that rows are looked up by. They get an index when they exist in the table
+    indexed_columns: ClassVar[Dict[str, List[str]]] = {
+        'members': ['id', 'tag_code', 'discord_name'],
+        'tags': ['tagger_id', 'tagged_id']
+    }
+
     valid_column_types: ClassVar[Dict[str, type]] = {
         'string': String,
         'integer': Integer,
@@ -69,7 +95,15 @@ class HvzDb:
     def __post_init__(self):
         # TODO: Need to make sure the required tables are always created. Might be config-depended now...
         self.database_config: Dict[str, Dict[str, str]] = copy.deepcopy(config['database_tables'])
-        self.engine = create_engine(f"sqlite+pysqlite:///{str(self.filepath)}", future=True)
+        # All database access happens on the event loop's thread, so one long-lived connection can serve every query.
+        # That saves reopening the file, rerunning the pragmas, and reloading the schema on each call
+        self.engine = create_engine(
+            f"sqlite+pysqlite:///{str(self.filepath)}",
+            future=True,
+            poolclass=StaticPool,
+            connect_args={'check_same_thread': False}
+        )
+        event.listen(self.engine, 'connect', _set_sqlite_pragmas)
 
         if not self.filepath.exists():
             logger.warning(
@@ -85,29 +119,48 @@ class HvzDb:
             logger.warning(f'Found a table called "{table_name}" in the config, but not in the database. Creating the table.')
 
 
-            column_args = []
-            # Add any required columns that are missing
-
-
-            # Create Columns from the config
+            # Columns from the config, keyed by the lowercase name they will be created with
+            merged_columns: Dict[str, str] = {}
             for column_name, type_string in column_dict.items():
-                column_args.append(self._create_column_object(column_name, type_string))
+                merged_columns.setdefault(column_name.casefold(), type_string)
 
-            if table_name in self.required_columns:
-                required_columns_table = self.required_columns[table_name]
-                for column_name, type_string in required_columns_table.items():
-                    if column_name in column_dict:
-                        continue
-                    column_args.append(self._create_column_object(column_name, type_string))
-                    logger.warning(f'The required column "{column_name}" was not found in the config for the table "{table_name}". Creating it.')
+            # Add any required columns that are missing
+            for column_name, type_string in self.required_columns.get(table_name, {}).items():
+                if column_name in merged_columns:
+                    continue
+                merged_columns[column_name] = type_string
+                logger.warning(f'The required column "{column_name}" was not found in the config for the table "{table_name}". Creating it.')
+
+            column_args = [self._create_column_object(column_name, type_string)
+                           for column_name, type_string in merged_columns.items()]
 
             self.tables[table_name] = Table(table_name.casefold(), self.metadata_obj, *column_args)
+            self._pending_creates.append(self.tables[table_name])
 
-        self.metadata_obj.create_all(self.engine)
+        self._create_pending_tables()
+        self._create_indexes()
 
         if config['google_sheet_export'] == True:
             self.sheet_interface = SheetsInterface(self)
 
+    def _create_pending_tables(self) -> None:
+        # Only checks and creates the tables just defined, rather than every table in the metadata
+        if not self._pending_creates:
+            return
+        self.metadata_obj.create_all(self.engine, tables=self._pending_creates)
+        self._pending_creates.clear()
+
+    def _create_indexes(self) -> None:
+        # Also adds the indexes to databases made before they existed. checkfirst skips ones already there
+        with self.engine.begin() as conn:
+            for table_name, column_names in self.indexed_columns.items():
+                table = self.tables.get(table_name)
+                if table is None:
+                    continue
+                for column_name in column_names:
+                    if column_name in table.c:
+                        Index(f'ix_{table.name}_{column_name}', table.c[column_name]).create(conn, checkfirst=True)
+
     def prepare_table(self, table_name: str, columns: Dict[str, Union[str, type]]) -> None:
         """
         Creates a new table in the database if there is none, and loads the table from the database if it exists already.
@@ -124,8 +177,9 @@ class HvzDb:
                 column_args.append(self._create_column_object(column_name, column_type))
 
             self.tables[table_name] = Table(table_name.casefold(), self.metadata_obj, *column_args)
+            self._pending_creates.append(self.tables[table_name])
 
-        self.metadata_obj.create_all(self.engine)
+        self._create_pending_tables()
         self.tables[table_name].column_names = columns.keys()
 
     def delete_table(self, table_name: str):
@@ -143,7 +197,13 @@ class HvzDb:
         else:
             raise KeyError(f'{table} is not recognized as a table.')
 
-    def _validate_column_selection(self, table: Table, *args: str) -> Column | List[Column]:
+    def _validate_column_selection(self, table: Table, *args: str) -> Column | Tuple[Column, ...]:
+        key = (table, args)
+        try:
+            return self._column_selections[key]
+        except KeyError:
+            pass
+
         if len(args) == 0:
             raise ValueError('Must supply a column name to validate.')
         result: List[Column] = []
@@ -153,10 +213,20 @@ class HvzDb:
             except KeyError:
                 raise ValueError(f'{column} not a column in {table.name}')
 
-        if len(result) == 1:
-            return result[0]
-        else:
-            return result
+        selection = result[0] if len(result) == 1 else tuple(result)
+        self._column_selections[key] = selection
+        return selection
+
+    def _statement(self, key: Tuple, build: Callable[[], Executable]) -> Executable:
+        """
+        Returns the cached statement for key, building and caching it first if needed.
+        The statement must take its values from bindparams so that it can be reused.
+        """
+        try:
+            return self._statements[key]
+        except KeyError:
+            statement = self._statements[key] = build()
+            return statement
 
     def _table_updated(self, table: Union[Table, str]) -> None:
         """
@@ -164,6 +234,8 @@ class HvzDb:
         :param table:
         :return:
         """
+        if self.sheet_interface is None:
+            return  # Sheet export is turned off
         try:
             if isinstance(table, Table): table_name = table.name
             else: table_name = table
@@ -182,15 +254,12 @@ class HvzDb:
         :return: Column object
         """
         if not isinstance(column_type, str):
-            if column_type in self.valid_column_types.items():
+            if column_type in self.valid_column_types.values():
                 column_type_object = column_type
             else:
                 raise TypeError(f'column_type is an invalid type: {type(column_type)}')
         else:
-            try:
-                column_type_object = self.valid_column_types[column_type.casefold()]
-            except KeyError:
-                column_type_object = String
+            column_type_object = self._column_type_from_string(column_type)
 
         kwargs = {}
         if column_type == 'incrementing_integer':
@@ -198,28 +267,44 @@ class HvzDb:
 
         return Column(column_name.casefold(), column_type_object, **kwargs)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _column_type_from_string(type_string: str) -> type:
+        # The same handful of type strings repeat across every configured column, so the lookup is memoized
+        column_type = HvzDb.valid_column_types.get(type_string)
+        if column_type is None:
+            # Config values are usually already lowercase, so only normalize when the direct lookup misses
+            column_type = HvzDb.valid_column_types.get(type_string.strip().casefold(), String)
+        return column_type
+
     def __add_row(self, table, row):
         # Old function acting as an alias
         return self.add_row(table, row)
 
-    def get_column_names(self, table: str) -> List[str]:
-        # Returns a list of column names in a table
+    def get_column_names(self, table: str) -> Tuple[str, ...]:
+        # Returns the column names in a table. A table's columns don't change once loaded, so this is cached per Table
         _table = self._validate_table_selection(table)
-        output = []
-        for c in _table.c:
-            output.append(c.name)
-        return output
+        try:
+            return self._column_names[_table]
+        except KeyError:
+            names = self._column_names[_table] = tuple(c.name for c in _table.c)
+            return names
 
     def add_row(self, table_selection:str, input_row: Dict) -> sqlalchemy.engine.CursorResult:
         table = self.tables[table_selection.casefold()]
 
-        row = {}
-        # Convert all column names to lowercase
-        for k, i in input_row.items():
-            row[k.casefold()] = i
+        # Convert all column names to lowercase. Internal callers already use lowercase keys, so skip the copy for them
+        if all(k == k.casefold() for k in input_row):
+            row = input_row
+        else:
+            row = {k.casefold(): i for k, i in input_row.items()}
 
+        # Validated here since unknown keys in the execute parameters would be silently ignored
+        if row:
+            self._validate_column_selection(table, *row)
+        inserter = self._statement((table, 'insert'), table.insert)
         with self.engine.begin() as conn:
-            result = conn.execute(table.insert().values(row))
+            result = conn.execute(inserter, row)
             self._table_updated(table)
             return result
 
@@ -238,10 +323,7 @@ class HvzDb:
             search_column = column.casefold()
         else:
             search_column = 'id'
-            if isinstance(value, discord.abc.User):
-                search_value = value.id
-            else:
-                search_value = value
+            search_value = getattr(value, 'id', value)  # Users and members carry their id; plain ids pass through
 
         member_row = self.__get_row(self.tables['members'], self.tables['members'].c[search_column], search_value)
         return member_row
@@ -265,10 +347,22 @@ class HvzDb:
         if filter_revoked is False:
             tag_row = self.__get_row(table, table.c[search_column], value)
         else:
-            tag_row = self.__get_row(table, table.c[search_column], value,
-                                     exclusion_column=table.c['revoked_tag'], exclusion_value=True)
+            tag_row = self.__get_active_tag(table, table.c[search_column], value)
         return tag_row
 
+    def __get_active_tag(self, table: Table, search_column: Column, search_value) -> Row:
+        # get_tag's filter_revoked lookup. The exclusion is always revoked_tag != True, so it is part of the statement
+        selection = self._statement(
+            (table, 'select_active_tag', search_column.name),
+            lambda: select(table).where(search_column == bindparam('_search_value')).
+                where(table.c['revoked_tag'] != True).limit(1)
+        )
+        with self.engine.connect() as conn:
+            result_row = conn.execute(selection, {'_search_value': search_value}).first()
+        if result_row is None:
+            raise ValueError(f'Could not find a row where \"{search_column}\" is \"{search_value}\"')
+        return result_row
+
     def __get_row(self, table, search_column, search_value, exclusion_column=None, exclusion_value=None):
         '''
         Returns the first Row object where the specified value matches.
@@ -284,52 +378,145 @@ class HvzDb:
         Returns:
                 row (Row): Row object. Access rows in these ways: row.some_row, row['some_row']
         '''
-        selection = select(table).where(search_column == search_value)
+        params = {'_search_value': search_value}
         if (exclusion_column is not None):
             if exclusion_value is None:
                 raise ValueError('No exclusion value provided.')
-            selection = selection.where(exclusion_column != exclusion_value)
-        with self.engine.begin() as conn:
-            result_row = conn.execute(selection).first()
+            params['_exclusion_value'] = exclusion_value
+
+        def build():
+            selection = select(table).where(search_column == bindparam('_search_value'))
+            if exclusion_column is not None:
+                selection = selection.where(exclusion_column != bindparam('_exclusion_value'))
+            return selection.limit(1)  # Only the first match is used, so SQLite can stop scanning there
+
+        selection = self._statement((table, 'select', search_column.name, getattr(exclusion_column, 'name', None)), build)
+        with self.engine.connect() as conn:
+            result_row = conn.execute(selection, params).first()
         if result_row is None:
             raise ValueError(f'Could not find a row where \"{search_column}\" is \"{search_value}\"')
         return result_row
 
+    def bulk_get(self, table: Table | str, search_column: str, search_values: List) -> List[Row]:
+        """
+        Returns every row whose search_column matches any of search_values, using a single SELECT.
+        Rows come back in table order, and values with no matching row are skipped rather than raising.
+        """
+        _table = self._validate_table_selection(table)
+        _search_column = self._validate_column_selection(_table, search_column)
+        if not search_values:
+            return []
+        selection = self._statement(
+            (_table, 'select_in', _search_column.name),
+            lambda: select(_table).where(_search_column.in_(bindparam('_search_values', expanding=True)))
+        )
+        with self.engine.connect() as conn:
+            return conn.execute(selection, {'_search_values': list(search_values)}).all()
+
     def get_table(self, table) -> List[Row]:
         _table = self._validate_table_selection(table)
-        selection = select(_table)
-        with self.engine.begin() as conn:
+        selection = self._statement((_table, 'select_all'), lambda: select(_table))
+        with self.engine.connect() as conn:
             result = conn.execute(selection).all()
             return result
 
     def edit_row(self, table: Table | str, search_column: str, search_value, target_column: str, target_value):
         _table = self._validate_table_selection(table)
         _search_column, _target_column = self._validate_column_selection(_table, search_column, target_column)
-        updator = (
-            update(_table).where(_search_column == search_value).
-                values({_target_column: target_value})
-        )
+        updator = self._update_statement(_table, _search_column, (_target_column,))
 
         with self.engine.begin() as conn:
-            result = conn.execute(updator)
+            result = conn.execute(updator, {'_search_value': search_value, '_set_' + _target_column.name: target_value})
         if result.rowcount > 0:
             self._table_updated(_table)
             return True
         else:
             raise ValueError(f'\"{search_value}\" not found in \"{search_column}\" column.')
 
+    def edit_row_multi(self, table: Table | str, search_column: str, search_value, changes: Dict[str, Any]):
+        """
+        Like edit_row, but sets several columns on the matching rows in one UPDATE.
+        :param changes: Maps column names to the values to set them to
+        """
+        if not changes:
+            raise ValueError('Must supply at least one column to change.')
+        _table = self._validate_table_selection(table)
+        _search_column = self._validate_column_selection(_table, search_column)
+        columns = tuple(self._validate_column_selection(_table, column) for column in changes)
+        updator = self._update_statement(_table, _search_column, columns)
+        params = {'_set_' + c.name: value for c, value in zip(columns, changes.values())}
+        params['_search_value'] = search_value
+
+        with self.engine.begin() as conn:
+            result = conn.execute(updator, params)
+        if result.rowcount > 0:
+            self._table_updated(_table)
+            return True
+        else:
+            raise ValueError(f'\"{search_value}\" not found in \"{search_column}\" column.')
+
+    def edit_rows(self, table: Table | str, search_column: str, target_column: str, pairs: List[Tuple[Any, Any]]) -> int:
+        """
+        Like edit_row, but for many rows at once. Runs one executemany UPDATE in a single transaction.
+        Unlike edit_row, finding nothing to edit is not an error.
+        :param pairs: (search_value, target_value) pairs. Rows matching search_value get target_value.
+        :return: The number of rows changed
+        """
+        _table = self._validate_table_selection(table)
+        _search_column, _target_column = self._validate_column_selection(_table, search_column, target_column)
+        if not pairs:
+            return 0
+        updator = self._update_statement(_table, _search_column, (_target_column,))
+        set_key = '_set_' + _target_column.name
+
+        with self.engine.begin() as conn:
+            result = conn.execute(updator, [{'_search_value': s, set_key: v} for s, v in pairs])
+        if result.rowcount > 0:
+            self._table_updated(_table)
+        return result.rowcount
+
+    def _update_statement(self, table: Table, search_column: Column, columns: Tuple[Column, ...]) -> Executable:
+        # UPDATE table SET column = :_set_column, ... WHERE search_column = :_search_value
+        return self._statement(
+            (table, 'update', search_column.name, tuple(c.name for c in columns)),
+            lambda: update(table).where(search_column == bindparam('_search_value')).
+                values({c: bindparam('_set_' + c.name, type_=c.type) for c in columns})
+        )
+
     def delete_row(self, table: Union[Table, str], search_column: str, search_value):
         _table = self._validate_table_selection(table)
         _search_column = self._validate_column_selection(_table, search_column)
 
-        deletor = delete(_table).where(_search_column == search_value)
+        deletor = self._statement(
+            (_table, 'delete', _search_column.name),
+            lambda: delete(_table).where(_search_column == bindparam('_search_value'))
+        )
         with self.engine.begin() as conn:
-            result = conn.execute(deletor)
+            result = conn.execute(deletor, {'_search_value': search_value})
         if result.rowcount < 1:
             raise ValueError(f'Could not find rows where \"{search_column}\" is \"{search_value}\"')
         self._table_updated(table)
         return True
 
+    def delete_rows(self, table: Union[Table, str], search_column: str, search_values: List) -> int:
+        """
+        Deletes every row whose search_column matches any of search_values in a single DELETE.
+        Unlike delete_row, finding nothing to delete is not an error.
+        :return: The number of rows deleted
+        """
+        _table = self._validate_table_selection(table)
+        _search_column = self._validate_column_selection(_table, search_column)
+
+        deletor = self._statement(
+            (_table, 'delete_in', _search_column.name),
+            lambda: delete(_table).where(_search_column.in_(bindparam('_search_values', expanding=True)))
+        )
+        with self.engine.begin() as conn:
+            result = conn.execute(deletor, {'_search_values': list(search_values)})
+        if result.rowcount > 0:
+            self._table_updated(_table)
+        return result.rowcount
+
     def get_rows(
             self,
             table: str,
@@ -338,7 +525,8 @@ class HvzDb:
             lower_value=None,
             upper_value=None,
             exclusion_column_name: str =None,
-            exclusion_value=None
+            exclusion_value=None,
+            columns: List[str] = None
     ) -> List[Row]:
         """
         Returns a list of Row objects where the specified value matches.
@@ -350,29 +538,53 @@ class HvzDb:
                 value (any): Value to search column for
                 exclusion_column_name (sqlalchemy.column) Optional. Reject rows where this column equals exclusion_value
                 exclusion_value (any) Optional. Required if exclusion_column_name is provided.
+                columns (list of str) Optional. Only fetch these columns. By default, every column is fetched.
 
         Returns:
                 result_rows: List of Row objects. Access rows in these ways: row.some_row, row['some_row']
         """
         _table = self._validate_table_selection(table)
-        selection = select(_table)
         _search_column = self._validate_column_selection(_table, search_column_name)
+        selected_columns = None
+        if columns:
+            selected_columns = self._validate_column_selection(_table, *columns)
+            if isinstance(selected_columns, Column):
+                selected_columns = (selected_columns,)
 
         if search_value:
-            selection = selection.where(_search_column == search_value)
+            search_shape = 'equal'
+            params = {'_search_value': search_value}
         elif lower_value and upper_value:
-            selection = selection.where(_search_column > lower_value).where(_search_column < upper_value)
+            search_shape = 'between'
+            params = {'_lower_value': lower_value, '_upper_value': upper_value}
         else:
             raise ValueError('If search_value is not provided, both lower_value and upper_value must be.')
 
+        _exclusion_column = None
         if exclusion_column_name:
             _exclusion_column = self._validate_column_selection(_table, exclusion_column_name)
             if not exclusion_value:
                 raise ValueError('No exclusion value provided.')
-            selection = selection.where(_exclusion_column != exclusion_value)
+            params['_exclusion_value'] = exclusion_value
 
-        with self.engine.begin() as conn:
-            result_rows: List[Row] = conn.execute(selection).all()
+        def build():
+            selection = select(*selected_columns) if selected_columns else select(_table)
+            if search_shape == 'equal':
+                selection = selection.where(_search_column == bindparam('_search_value'))
+            else:
+                selection = selection.where(_search_column > bindparam('_lower_value')).where(
+                    _search_column < bindparam('_upper_value'))
+            if _exclusion_column is not None:
+                selection = selection.where(_exclusion_column != bindparam('_exclusion_value'))
+            return selection
+
+        selection = self._statement(
+            (_table, 'select_many', _search_column.name, search_shape, getattr(_exclusion_column, 'name', None),
+             tuple(columns) if columns else None),
+            build
+        )
+        with self.engine.connect() as conn:
+            result_rows: List[Row] = conn.execute(selection, params).all()
 
         if len(result_rows) == 0:
             if lower_value:
@@ -1,5 +1,5 @@
+import asyncio
 import sys
-from pathlib import Path
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
@@ -23,6 +23,7 @@ if TYPE_CHECKING:
 
 guild_id_list = [config['server_id']]
 LAST_GAME_PLOT_HASH = None
+PANEL_LOAD_CONCURRENCY = 5  # Panel messages fetched at once on startup. Kept low for Discord's rate limits.
 
 def create_game_plot(db: 'HvzDb', filepath=None) -> discord.File:
     global LAST_GAME_PLOT_HASH
@@ -112,7 +113,7 @@ class HumanElement(PanelElement):
         return 'on_role_change'
 
     def add(self, embed: discord.Embed, panel: "HVZPanel") -> None:
-        human_count = len(panel.bot.roles['human'].members)
+        human_count = panel.bot.get_role_count('human')
         embed.add_field(name='Humans', value=str(human_count))
 
 
@@ -122,7 +123,7 @@ class ZombieElement(PanelElement):
         return 'on_role_change'
 
     def add(self, embed: discord.Embed, panel: "HVZPanel") -> None:
-        count = len(panel.bot.roles['zombie'].members)
+        count = panel.bot.get_role_count('zombie')
         embed.add_field(name='Zombies', value=str(count))
 
 
@@ -132,7 +133,7 @@ class PlayerElement(PanelElement):
         return 'on_role_change'
 
     def add(self, embed: discord.Embed, panel: "HVZPanel") -> None:
-        count = len(panel.bot.roles['player'].members)
+        count = panel.bot.get_role_count('player')
         embed.add_field(name='Players', value=str(count))
 
 
@@ -148,8 +149,8 @@ class PlayersTodayElement(PanelElement):
                 table='members',
                 search_column_name='registration_time',
                 lower_value=datetime.now(tz=config.time_zone) - timedelta(days=1),
-                upper_value=datetime.now(tz=config.time_zone)
-
+                upper_value=datetime.now(tz=config.time_zone),
+                columns=['registration_time']
             )
             count = len(rows)
         except ValueError:
@@ -172,7 +173,8 @@ class TagsTodayElement(PanelElement):
                 table='tags',
                 search_column_name='tag_time',
                 lower_value=datetime.now(tz=config.time_zone) - timedelta(days=1),
-                upper_value=datetime.now(tz=config.time_zone)
+                upper_value=datetime.now(tz=config.time_zone),
+                columns=['tag_time']
             )
             count = len(rows)
         except ValueError:
@@ -277,12 +279,15 @@ class HVZPanel:
         self.bot.db.add_row('persistent_panels', row_data)
 
     async def load(self, row: sqlalchemy.engine.Row) -> Union["HVZPanel", None]:
+        """Loads a saved panel. Returns None if its message is gone, and the caller should remove the row."""
         self.channel = self.bot.guild.get_channel(row['channel_id'])
+        if self.channel is None:
+            logger.warning('Could not find the channel of a panel. Removing it from the database.')
+            return None
         try:
             self.message = await self.channel.fetch_message(row['message_id'])
         except discord.NotFound:
             logger.warning('Could not find panel message. Removing it from the database.')
-            self.bot.db.delete_row('persistent_panels', 'message_id', row['message_id'])
             return None
 
         self.load_elements(row['elements'].split(','))
@@ -303,13 +308,11 @@ class HVZPanel:
 class DisplayCog(discord.Cog, guild_ids=guild_id_list):
     bot: 'HVZBot'
     panels: Dict[int, "HVZPanel"]
-    roles_to_watch: List[discord.Role]
     readied: bool
 
     def __init__(self, bot: "HVZBot"):
         self.bot = bot
         self.panels = {}
-        self.roles_to_watch = []
         self.readied = False
 
         bot.db.prepare_table('persistent_panels', columns={
@@ -327,10 +330,7 @@ class DisplayCog(discord.Cog, guild_ids=guild_id_list):
         panel = self.panels.pop(message_id, None)
         if panel:
             panel.remove_listeners()
-        try:
-            self.bot.db.delete_row('persistent_panels', 'message_id', message_id)
-        except ValueError:
-            pass
+        self.bot.db.delete_rows('persistent_panels', 'message_id', [message_id])
 
     @slash_command(description='Post a message with various live-updating game statistics.')
     async def post_panel(
@@ -371,19 +371,32 @@ class DisplayCog(discord.Cog, guild_ids=guild_id_list):
         if self.readied:
             return # Don't do this on_ready event more than once
         self.readied = True
-        # Load persistent panels from the database.
+        # Load persistent panels from the database. Message fetches run concurrently, a few at a time.
         rows = self.bot.db.get_table('persistent_panels')
-        for row in rows:
-            loaded_panel = await HVZPanel(self).load(row)
+        semaphore = asyncio.Semaphore(PANEL_LOAD_CONCURRENCY)
+
+        async def load_panel(row: sqlalchemy.engine.Row) -> Union["HVZPanel", None]:
+            async with semaphore:
+                return await HVZPanel(self).load(row)
+
+        # One panel failing to load (lost permissions, Discord errors) must not stop the others or the cleanup below
+        loaded_panels = await asyncio.gather(*(load_panel(row) for row in rows), return_exceptions=True)
+        missing_message_ids = []
+        for row, loaded_panel in zip(rows, loaded_panels):
+            if isinstance(loaded_panel, BaseException):
+                logger.opt(exception=loaded_panel).error(
+                    f'Failed to load the panel with message id {row["message_id"]} in channel {row["channel_id"]}: {loaded_panel}')
+                continue
             if not loaded_panel:
+                missing_message_ids.append(row['message_id'])
                 continue
             self.add_panel(loaded_panel)
+        if missing_message_ids:
+            self.bot.db.delete_rows('persistent_panels', 'message_id', missing_message_ids)
 
     @discord.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
-        for name, role in self.bot.roles.items():
-            self.roles_to_watch.append(role)
-        changed = have_lists_changed(before.roles, after.roles, self.roles_to_watch)
+        changed = have_lists_changed(before.roles, after.roles, self.bot.roles.values())
         if not changed:
             return
         self.bot.dispatch('role_change')
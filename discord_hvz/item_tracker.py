@@ -165,9 +165,7 @@ class ItemTrackerCog(commands.Cog, guild_ids=guild_id_list):
             return
 
         table = self.bot.db.get_table(table_name)
-
-        for row in table:
-            self.bot.db.delete_row(table_name, 'id', row['id'])
+        self.bot.db.delete_rows(table_name, 'id', [row['id'] for row in table])
 
         await ctx.respond('Deleted all items.')
 
@@ -3,16 +3,16 @@ from __future__ import annotations
 
 import functools
 import asyncio
+import copy
 import logging
+import logging.handlers
+import queue
 import sys
-import time
 from datetime import datetime
 from os import getenv
-from pathlib import Path
-from typing import Dict, Union, Any, Type
+from typing import Callable, Dict, List, Tuple, Union, Any, Type
 
 import discord
-import loguru
 from discord import Guild
 from discord.ext import commands
 from dotenv import load_dotenv
@@ -33,12 +33,6 @@ from discord_hvz.database import HvzDb
 VERSION = "0.3.0"
 
 
-def dump(obj):
-    """Prints the passed object in a very detailed form for debugging"""
-    for attr in dir(obj):
-        print("obj.%s = %r" % (attr, getattr(obj, attr)))
-
-
 load_dotenv()  # Load the Discord token from the .env file
 TOKEN = getenv("TOKEN")
 
@@ -50,22 +44,88 @@ logger.add(log_path, rotation='1 week', level='DEBUG', mode='a')
 
 discord_handler = logging.getLogger('discord')
 
+# Loguru level names for the standard logging levels, resolved once instead of per record
+_LEVEL_MAP: Dict[str, str] = {}
+for _level_name in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+    try:
+        _LEVEL_MAP[_level_name] = logger.level(_level_name).name
+    except ValueError:
+        pass
+
 
 class InterceptHandler(logging.Handler):
+    """
+    Forwards records from the standard logging module to loguru.
+    This runs on the thread of discord_log_listener, not the thread that logged the record, so the caller's
+    location is taken from the record rather than from the call stack.
+    """
     def emit(self, record):
         # Get corresponding Loguru level if it exists
+        level = _LEVEL_MAP.get(record.levelname, record.levelno)
+
+        def patch_location(loguru_record):
+            loguru_record.update(name=record.name, function=record.funcName, line=record.lineno)
+
+        logger.patch(patch_location).opt(exception=record.exc_info).log(level, record.getMessage())
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler for a bounded queue that drops records, rather than blocking or erroring, when it is full."""
+    dropped: int
+
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # QueueHandler.prepare formats the traceback into the message and clears exc_info.
+        # Only merge the arguments here, so InterceptHandler can give exc_info to loguru to render.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
         try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Pycord logs into a queue, which is all the event loop pays for. The listener thread passes records to loguru.
+# The queue is bounded so that a flood of gateway warnings can't grow memory without limit.
+DISCORD_LOG_QUEUE_SIZE = 1000
+discord_log_queue = queue.Queue(maxsize=DISCORD_LOG_QUEUE_SIZE)
+discord_queue_handler = DroppingQueueHandler(discord_log_queue)
+discord_handler.addHandler(discord_queue_handler)
+discord_log_listener = logging.handlers.QueueListener(discord_log_queue, InterceptHandler())
+
+# Seconds to wait for a member's updates to settle before writing them, so a burst of edits is one UPDATE
+MEMBER_UPDATE_DELAY = 0.5
 
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
 
-        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+def _message_guild_id(message: discord.Message, my_guild_id: int) -> int:
+    if message.channel.type is discord.ChannelType.private:
+        return my_guild_id  # Treat private messages as if they are part of this guild
+    return message.guild.id
+
+
+# Maps the type of an event's first argument to a function that finds which guild it came from
+_GUILD_ID_EXTRACTORS: Dict[type, Callable[[Any, int], int]] = {
+    discord.Interaction: lambda ctx, my_guild_id: ctx.guild_id,
+    discord.message.Message: _message_guild_id,
+    discord.Member: lambda ctx, my_guild_id: ctx.guild.id,
+    commands.Context: lambda ctx, my_guild_id: my_guild_id,
+}
+
+
+def _find_guild_id_extractor(ctx_type: type) -> Callable[[Any, int], int]:
+    # Handles subclasses of the types above, remembering the answer so the next lookup is direct
+    for base_type, extractor in list(_GUILD_ID_EXTRACTORS.items()):
+        if issubclass(ctx_type, base_type):
+            _GUILD_ID_EXTRACTORS[ctx_type] = extractor
+            return extractor
+    raise TypeError(f'check_event does not know how to find the guild of a {ctx_type.__name__}')
 
 
 class StartupError(Exception):
@@ -79,9 +139,10 @@ class HVZBot(discord.ext.commands.Bot):
     db: HvzDb
     roles: Dict[str, discord.Role]
     channels: Dict[str, discord.TextChannel]
-    discord_handler: loguru.Logger
     _cog_startup_data: Dict[str, Dict[str, Any]]
     readied: bool
+    _role_counts: Dict[str, int]  # Members holding each game role, kept current by role change events
+    _pending_member_updates: Dict[int, Tuple[asyncio.TimerHandle, bool, bool]]
 
     def check_event(self, func):
         """
@@ -92,18 +153,9 @@ class HVZBot(discord.ext.commands.Bot):
         @functools.wraps(func)
         async def inner(ctx, *args, **kwargs):
             my_guild_id = self.guild.id
-            if isinstance(ctx, discord.Interaction):
-                guild_id = ctx.guild_id
-            elif isinstance(ctx, discord.message.Message):
-                if ctx.channel.type == discord.ChannelType.private:
-                    guild_id = my_guild_id  # Treat private messages as if they are part of this guild
-                else:
-                    guild_id = self.guild.id
-            elif isinstance(ctx, discord.Member):
-                guild_id = ctx.guild.id
-            elif isinstance(ctx, commands.Context):
-                guild_id = my_guild_id
-            if guild_id != my_guild_id:
+            ctx_type = type(ctx)
+            extractor = _GUILD_ID_EXTRACTORS.get(ctx_type) or _find_guild_id_extractor(ctx_type)
+            if extractor(ctx, my_guild_id) != my_guild_id:
                 return
             result = await func(ctx, *args, **kwargs)
 
@@ -117,8 +169,14 @@ class HVZBot(discord.ext.commands.Bot):
         self.channels = {}
         self.db = HvzDb()
         self.readied = False
-
-        intents = discord.Intents.all()
+        self._role_counts = {'human': 0, 'zombie': 0, 'player': 0}
+        # Member id -> (timer for the delayed write, whether roles changed, whether the nickname changed)
+        self._pending_member_updates = {}
+
+        # Presences and typing are left off since the bot never reads them, and they are most of the gateway traffic
+        intents = discord.Intents.default()
+        intents.members = True  # Role and nickname updates, plus the member cache used for role counts
+        intents.message_content = True  # Chatbot replies
         super().__init__(
             description='Discord HvZ bot!',
             intents=intents
@@ -157,10 +215,20 @@ class HVZBot(discord.ext.commands.Bot):
                 else:
                     raise ConfigError(f'This bot is not on any server matching the "server_id" set in config.yml. Either the ID is set wrong, or the bot account has not joined the server.')
 
-                # Updates the cache with all members and channels and roles
-                await self.guild.fetch_members(limit=500).flatten()
-                await self.guild.fetch_channels()
-                await self.guild.fetch_roles()
+                # Members need no fetch: with the members intent, Pycord chunks the whole member list into its cache
+                # before on_ready. Channels and roles don't depend on each other.
+                await asyncio.gather(
+                    self.guild.fetch_channels(),
+                    self.guild.fetch_roles()
+                )
+
+                # Index the server's roles and channels by lowercase name. The first of any duplicate names wins.
+                roles_by_name: Dict[str, discord.Role] = {}
+                for role in self.guild.roles:
+                    roles_by_name.setdefault(role.name.lower(), role)
+                channels_by_name: Dict[str, discord.abc.GuildChannel] = {}
+                for channel in self.guild.channels:
+                    channels_by_name.setdefault(channel.name.lower(), channel)
 
                 needed_roles_names = ['zombie', 'human', 'player']
                 missing_role_names = []
@@ -171,7 +239,7 @@ class HVZBot(discord.ext.commands.Bot):
                         # If there is no role name assigned in the config, use a default
                         role_name = needed_role_name
 
-                    found_role = discord.utils.find(lambda c: c.name.lower() == role_name, self.guild.roles)
+                    found_role = roles_by_name.get(str(role_name).lower())
                     if found_role is None:
                         missing_role_names.append(needed_role_name)
                     else:
@@ -186,7 +254,7 @@ class HVZBot(discord.ext.commands.Bot):
                         # If there is no channel name assigned in the config, use a default
                         channel_name = needed_channel_name
 
-                    found_channel = discord.utils.find(lambda c: c.name.lower() == channel_name, self.guild.channels)
+                    found_channel = channels_by_name.get(str(channel_name).lower())
                     if found_channel is None:
                         missing_channel_names.append(needed_channel_name)
                     else:
@@ -200,17 +268,21 @@ class HVZBot(discord.ext.commands.Bot):
                 if msg:
                     raise StartupError(msg)
 
+                # Counting role members walks the whole member cache, so count once and keep the totals updated
+                for role_name in self._role_counts:
+                    self._role_counts[role_name] = len(self.roles[role_name].members)
+
                 log.success(
                     f'Discord-HvZ Bot launched correctly! Logged in as: {self.user.name} ------------------------------------------')
             except StartupError as e:
                 logger.error(f'The bot failed to start because of this error: \n{e}')
                 await self.close()
-                time.sleep(1)
+                await asyncio.sleep(1)
             except Exception as e:
                 log.error('Bot startup failed.')
                 log.exception(e)
                 await self.close()
-                time.sleep(1)
+                await asyncio.sleep(1)
 
         @self.event
         async def on_error(event: str, *args, **kwargs):
@@ -246,21 +318,89 @@ class HVZBot(discord.ext.commands.Bot):
         @self.listen()
         @self.check_event
         async def on_member_update(before, after):
+            # Presence, avatar and timeout changes also land here; skip them before touching the database
+            roles_changed = before.roles != after.roles
+            nick_changed = before.nick != after.nick
+            if not roles_changed and not nick_changed:
+                return
+
+            if roles_changed:
+                self._adjust_role_counts(before.roles, after.roles)
+
             # When roles or nicknames change, update the database and sheet.
+            self._schedule_member_update(after.id, roles_changed, nick_changed)
+
+        @self.listen()
+        @self.check_event
+        async def on_member_remove(member):
+            self._adjust_role_counts(member.roles, [])
+
+    def _adjust_role_counts(self, before_roles: List[discord.Role], after_roles: List[discord.Role]) -> None:
+        # Keeps _role_counts in step with a member gaining or losing game roles
+        before_ids = {role.id for role in before_roles}
+        after_ids = {role.id for role in after_roles}
+        for role_name in self._role_counts:
+            role = self.roles.get(role_name)
+            if role is None:
+                continue
+            had_role = role.id in before_ids
+            has_role = role.id in after_ids
+            if has_role and not had_role:
+                self._role_counts[role_name] += 1
+            elif had_role and not has_role:
+                self._role_counts[role_name] -= 1
+
+    def _schedule_member_update(self, member_id: int, roles_changed: bool, nick_changed: bool) -> None:
+        # Restarts the member's timer, keeping track of everything that changed since the last write
+        pending = self._pending_member_updates.get(member_id)
+        if pending is not None:
+            handle, pending_roles_changed, pending_nick_changed = pending
+            handle.cancel()
+            roles_changed = roles_changed or pending_roles_changed
+            nick_changed = nick_changed or pending_nick_changed
+        handle = asyncio.get_running_loop().call_later(MEMBER_UPDATE_DELAY, self._flush_member_update, member_id)
+        self._pending_member_updates[member_id] = (handle, roles_changed, nick_changed)
+
+    def _flush_member_update(self, member_id: int) -> None:
+        # Writes the member's current faction and nickname in one UPDATE
+        _, roles_changed, nick_changed = self._pending_member_updates.pop(member_id)
+        # This runs as a plain event loop callback, so errors have to be logged here or they never reach loguru
+        try:
+            member = self.guild.get_member(member_id)
+            if member is None:
+                return  # They left the server before the write went out
             try:
-                self.db.get_member(before.id)
+                self.db.get_member(member_id)
             except ValueError:
                 return
-            if not before.roles == after.roles:
-                zombie = self.roles['zombie'] in after.roles
-                human = self.roles['human'] in after.roles
+            changes = {}
+            if roles_changed:
+                roles = self.roles
+                role_ids = {role.id for role in member.roles}
+                zombie = roles['zombie'].id in role_ids
+                human = roles['human'].id in role_ids
                 if zombie and not human:
-                    self.db.edit_row('members', 'id', after.id, 'faction', 'zombie')
+                    changes['faction'] = 'zombie'
                 elif human and not zombie:
-                    self.db.edit_row('members', 'id', after.id, 'faction', 'human')
-            if not before.nick == after.nick:
-                self.db.edit_row('members', 'id', after.id, 'nickname', after.nick)
-                log.debug(f'{after.name} changed their nickname.')
+                    changes['faction'] = 'human'
+            if nick_changed:
+                changes['nickname'] = member.nick
+                log.debug('{} changed their nickname.', member.name)
+            if changes:
+                self.db.edit_row_multi('members', 'id', member_id, changes)
+        except Exception as e:
+            log.exception(f'Failed to save an update for member {member_id}: {e}')
+
+    async def close(self) -> None:
+        # Write out any member updates still waiting on their timers
+        for member_id, (handle, _, _) in list(self._pending_member_updates.items()):
+            handle.cancel()
+            self._flush_member_update(member_id)
+        await super().close()
+
+    def get_role_count(self, role_name: str) -> int:
+        """Returns how many members have the game role 'human', 'zombie', or 'player'. Cheaper than len(role.members)"""
+        return self._role_counts[role_name]
 
     def get_member(self, user_id: int):
         user_id = int(user_id)
@@ -269,8 +409,8 @@ class HVZBot(discord.ext.commands.Bot):
 
     async def announce_tag(self, tagged_member: discord.Member, tagger_member: discord.Member, tag_time: datetime):
 
-        new_human_count = len(self.roles['human'].members)
-        new_zombie_count = len(self.roles['zombie'].members)
+        new_human_count = self.get_role_count('human')
+        new_zombie_count = self.get_role_count('zombie')
 
         msg = f'<@{tagged_member.id}> has turned zombie!'
         if not config['silent_oz']:
@@ -295,6 +435,7 @@ class HVZBot(discord.ext.commands.Bot):
 
 
 def main():
+    discord_log_listener.start()
     try:
         logger.info(f'Launching Discord-HvZ version {VERSION}  ...')
         if sys.platform == 'win32':
@@ -330,6 +471,10 @@ def main():
     else:
         logger.success('The bot has shut down normally.')
     finally:
+        discord_log_listener.stop()
+        if discord_queue_handler.dropped:
+            logger.warning(f'{discord_queue_handler.dropped} log messages from Pycord were dropped because too many '
+                           f'arrived at once.')
         logger.info('Press Enter to close.')
         input()
 
@@ -2,7 +2,6 @@ from __future__ import print_function, annotations
 
 import asyncio
 import logging
-from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, TYPE_CHECKING
 
@@ -113,14 +112,15 @@ class SheetsInterface:
         # Let's turn the list of Rows into a list of lists. Google wants that.
 
         values = []
-        for y, row in enumerate(table):
-            values.append([])
-            for x, column in enumerate(column_order):
+        for row in table:
+            row_values = []
+            for column in column_order:
                 cell = row[column]
                 if isinstance(cell, datetime):
                     cell = cell.isoformat()
 
-                values[y].append(cell)
+                row_values.append(cell)
+            values.append(row_values)
 
 
         values.insert(0, column_order)
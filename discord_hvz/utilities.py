@@ -3,7 +3,7 @@ import asyncio
 import random
 import string
 from inspect import iscoroutinefunction
-from typing import Dict, List, TYPE_CHECKING, Union
+from typing import Dict, List, Iterable, TYPE_CHECKING, Union
 
 import discord
 from discord.ext import pages
@@ -69,7 +69,8 @@ def _tag_tree_loop(db: HvzDb, bot: HVZBot, table: List[sqlalchemy.engine.Row], l
         else:
             output += f'{row.name}'
         try:
-            tags = db.get_rows('tags', 'tagger_id', row.id, exclusion_column_name='revoked_tag', exclusion_value=True)
+            tags = db.get_rows('tags', 'tagger_id', row.id, exclusion_column_name='revoked_tag', exclusion_value=True,
+                               columns=['tagged_id'])
         # If the player had no tags...
         except ValueError:
             pass
@@ -79,9 +80,9 @@ def _tag_tree_loop(db: HvzDb, bot: HVZBot, table: List[sqlalchemy.engine.Row], l
             if len(tags) > 1:
                 output += 's'
             output += ':'
-            tagged_members = []
-            for tag_row in tags:
-                tagged_members.append(db.get_member(tag_row.tagged_id))
+            tagged_ids = [tag_row.tagged_id for tag_row in tags]
+            members_by_id = {member_row.id: member_row for member_row in db.bulk_get('members', 'id', tagged_ids)}
+            tagged_members = [members_by_id[tagged_id] for tagged_id in tagged_ids if tagged_id in members_by_id]
 
             output += _tag_tree_loop(db, bot, tagged_members, level + 1)
 
@@ -93,7 +94,7 @@ def _add_indention(level: int, last=False):
     Add indentation characters for a tag tree based on recursion depth, with pretty terminators.
     """
     output = ''
-    for i, x in enumerate(range(level)):
+    for i in range(level):
         if i == level - 1:
             if last:
                 output += '└──'
@@ -142,7 +143,6 @@ def _get_ozs(bot: "HVZBot", db: HvzDb) -> List[sqlalchemy.engine.Row]:
     """
     tags = db.get_table('tags')
     set_of_all_zombies = set()
-    oz_member_rows = []
 
     # Adds anyone who has made a tag. Since it is a Set, there will be no duplicates
     for tag in tags:
@@ -152,18 +152,17 @@ def _get_ozs(bot: "HVZBot", db: HvzDb) -> List[sqlalchemy.engine.Row]:
     for zombie_member in bot.roles['zombie'].members:
         set_of_all_zombies.add(zombie_member.id)
 
-    for tagger_id in set_of_all_zombies:
+    # Zombies who have never been tagged are OZs. Rows with a missing or garbled tagged_id are skipped
+    set_of_tagged = set()
+    for tag in tags:
         try:
-            # If a zombie has been tagged, do nothing.
-            db.get_rows('tags', 'tagged_id', tagger_id)
-            continue
-        except ValueError:
+            set_of_tagged.add(int(tag.tagged_id))
+        except (TypeError, ValueError):
             pass
-        try:
-            # If a zombie has not been tagged, add them to the OZ list
-            oz_member_rows.append(db.get_member(tagger_id))
-        except ValueError:
-            logger.warning(f'While making the tag tree, member in tags table not found in the members table.')
+    oz_ids = [str(member_id) for member_id in set_of_all_zombies - set_of_tagged]
+    oz_member_rows = db.bulk_get('members', 'id', oz_ids)
+    if len(oz_member_rows) < len(oz_ids):
+        logger.warning(f'While making the tag tree, member in tags table not found in the members table.')
     return oz_member_rows
 
 
@@ -237,15 +236,12 @@ async def do_after_wait(func: callable, delay: float, *args, **kwargs):
         logger.exception(e)
 
 
-def have_lists_changed(list1: List, list2: List, items: List) -> bool:
+def have_lists_changed(list1: List, list2: List, items: Iterable) -> bool:
+    """Returns True if any of items is in exactly one of the two lists. The items must be hashable."""
     if list1 == list2:
         return False
-    for item in items:
-        if item in list1 and item not in list2:
-            return True
-        elif item in list2 and item not in list1:
-            return True
-    return False
+    changed = set(list1).symmetric_difference(list2)
+    return any(item in changed for item in items)
 
 
 def dump(obj):
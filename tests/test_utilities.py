@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('discord')
+pytest.importorskip('loguru')
+
+from discord_hvz import utilities
+
+
+class FakeDb:
+    def __init__(self, tags, members):
+        self.tags = tags
+        self.members = members
+
+    def get_table(self, table):
+        assert table == 'tags'
+        return self.tags
+
+    def bulk_get(self, table, search_column, search_values):
+        assert (table, search_column) == ('members', 'id')
+        return [row for row in self.members if row.id in search_values]
+
+
+def test_get_ozs_skips_tags_with_empty_tagged_id():
+    tags = [
+        SimpleNamespace(tagger_id='1', tagged_id='2'),
+        SimpleNamespace(tagger_id='1', tagged_id=None),
+        SimpleNamespace(tagger_id='1', tagged_id=''),
+    ]
+    members = [SimpleNamespace(id='1', name='oz'), SimpleNamespace(id='2', name='tagged')]
+    bot = SimpleNamespace(roles={'zombie': SimpleNamespace(members=[SimpleNamespace(id=2)])})
+
+    oz_rows = utilities._get_ozs(bot, FakeDb(tags, members))
+
+    assert [row.id for row in oz_rows] == ['1']